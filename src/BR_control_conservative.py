@@ -6,7 +6,6 @@ using the same constant step. The quantization step is multipled by 2
 each time 2 lost chunks has been detected. Otherwise, the quantization
 step size is divided by 1.1.'''
 
-import time
 import logging
 
 import minimal
@@ -19,16 +18,14 @@ class BR_Control_Conservative(BR_control_no.BR_Control_No):
         logging.info(__doc__)
 
     def data_flow_control(self):
-        while True:
-            self.number_of_lost_packets = self.number_of_sent_chunks - self.number_of_received_chunks
-            if self.number_of_lost_packets > 2:
-                self.quantization_step_size *= 2
-            self.quantization_step_size = int(self.quantization_step_size / 1.1)
-            if self.quantization_step_size < minimal.args.minimal_quantization_step_size:
-                self.quantization_step_size = minimal.args.minimal_quantization_step_size
-            self.number_of_sent_chunks = 0
-            self.number_of_received_chunks = 0
-            time.sleep(self.rate_control_period)
+        self.number_of_lost_packets = self.number_of_sent_chunks - self.number_of_received_chunks
+        if self.number_of_lost_packets > 2:
+            self.quantization_step_size *= 2
+        self.quantization_step_size = int(self.quantization_step_size / 1.1)
+        if self.quantization_step_size < minimal.args.minimal_quantization_step_size:
+            self.quantization_step_size = minimal.args.minimal_quantization_step_size
+        self.number_of_sent_chunks = 0
+        self.number_of_received_chunks = 0
 
 class BR_Control_Conservative__verbose(BR_Control_Conservative, BR_control_no.BR_Control_No__verbose):
     pass
@@ -5,7 +5,6 @@
 using the same constant step. The quantization step size is the number
 of lost packed minus 1.'''
 
-import time
 import logging
 
 import minimal
@@ -18,14 +17,12 @@ class BR_Control_Lost(BR_control_no.BR_Control_No):
         logging.info(__doc__)
 
     def data_flow_control(self):
-        while True:
-            self.number_of_lost_packets = self.number_of_sent_chunks - self.number_of_received_chunks# - 1
-            self.quantization_step_size = self.number_of_lost_packets - 1
-            if self.quantization_step_size < minimal.args.minimal_quantization_step_size:
-                self.quantization_step_size = minimal.args.minimal_quantization_step_size
-            self.number_of_sent_chunks = 0
-            self.number_of_received_chunks = 0
-            time.sleep(self.rate_control_period)
+        self.number_of_lost_packets = self.number_of_sent_chunks - self.number_of_received_chunks# - 1
+        self.quantization_step_size = self.number_of_lost_packets - 1
+        if self.quantization_step_size < minimal.args.minimal_quantization_step_size:
+            self.quantization_step_size = minimal.args.minimal_quantization_step_size
+        self.number_of_sent_chunks = 0
+        self.number_of_received_chunks = 0
 
 class BR_Control_Lost__verbose(BR_Control_Lost, BR_control_no.BR_Control_No__verbose):
     pass
@@ -15,8 +15,6 @@ constant step size.'''
 
 import numpy as np
 import math
-import threading
-import time
 import logging
 
 import minimal
@@ -39,17 +37,24 @@ class BR_Control_No(Compression):
         logging.info(f"(minimum) quantization_step_size = {minimal.args.minimal_quantization_step_size}")
         self.number_of_sent_chunks = 0
         self.number_of_received_chunks = 0
-        data_flow_control_thread = threading.Thread(target=self.data_flow_control)
-        data_flow_control_thread.daemon = True
-        data_flow_control_thread.start()
+        # The bit-rate control is run from send() each
+        # chunks_per_rate_control_period sent chunks, instead of by a
+        # thread that sleeps rate_control_period seconds.
+        self.chunks_per_rate_control_period = max(1, int(round(self.rate_control_period / self.chunk_time)))
+        logging.info(f"chunks_per_rate_control_period = {self.chunks_per_rate_control_period}")
 
     def data_flow_control(self):
-        while True:
-            time.sleep(self.rate_control_period)
+        '''Runs once per rate control period. Without bit-rate control,
+        only the counters are reset. Subclasses override this method
+        with their control step.'''
+        self.number_of_sent_chunks = 0
+        self.number_of_received_chunks = 0
 
     def send(self, packed_chunk):
         super().send(packed_chunk)
         self.number_of_sent_chunks += 1
+        if self.number_of_sent_chunks >= self.chunks_per_rate_control_period:
+            self.data_flow_control()
 
     def receive(self):
         packed_chunk = super().receive()
@@ -60,7 +65,12 @@ class BR_Control_No(Compression):
         '''Dead-zone quantizer.'''
         #quantized_chunk = np.round(chunk / self.quantization_step_size).astype(np.int16)
         #quantized_chunk = (chunk / self.quantization_step_size).astype(np.int16)
-        quantized_chunk = (chunk / self.quantization_step_size).astype(np.int32)
+        # The division is performed in float32: the samples (and
+        # their stereo/temporal transforms) need far less than the 24
+        # bits of mantissa of a float32, and float64 would only double
+        # the memory traffic of this method, that runs for each sent
+        # chunk.
+        quantized_chunk = np.divide(chunk, self.quantization_step_size, dtype=np.float32).astype(np.int32)
         return quantized_chunk
     
     def dequantize(self, quantized_chunk):
@@ -4,6 +4,10 @@
 """Over minimal, implements a random access buffer structure for hiding the jitter."""
 
 import argparse
+import os
+import sys
+import mmap
+import ctypes
 import sounddevice as sd
 import numpy as np
 import socket
@@ -17,28 +21,56 @@ import soundfile as sf
 import logging
 
 minimal.parser.add_argument("-b", "--buffering_time", type=int, default=150, help="Miliseconds to buffer")
+minimal.parser.add_argument("--busy_poll", type=int, default=0, help="Microseconds to busy poll the NIC when receiving (Linux only, 0 = disabled, raising the system default requires CAP_NET_ADMIN)")
+minimal.parser.add_argument("--receiving_CPU", type=int, help="CPU where the receiving thread runs (Linux only)")
 
 class Buffering(minimal.Minimal):
 
-    CHUNK_NUMBERS = 1 << 15 # Enought for most buffering times.
+    CHUNK_NUMBERS = 1 << 15 # Enought for most buffering times. Must be a power of 2.
+    CHUNK_NUMBERS_MASK = CHUNK_NUMBERS - 1 # x & CHUNK_NUMBERS_MASK == x % CHUNK_NUMBERS
+    SOCKET_BUFFER_BYTES = 12582912 # Requested size of the kernel's socket buffers (limited by net.core.rmem_max and net.core.wmem_max).
 
     def __init__(self):
         ''' Initializes the buffer. '''
         super().__init__()
         logging.info(__doc__)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_BYTES)
+        except OSError as e: # E.g., ENOBUFS above kern.ipc.maxsockbuf in OSX/BSD.
+            logging.warning(f"Unable to set SO_RCVBUF: {e}")
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER_BYTES)
+        except OSError as e:
+            logging.warning(f"Unable to set SO_SNDBUF: {e}")
+        logging.info(f"SO_RCVBUF = {self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes")
+        logging.info(f"SO_SNDBUF = {self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)} bytes")
         if minimal.args.buffering_time <= 0:
             minimal.args.buffering_time = 1 # ms
         logging.info(f"buffering_time = {minimal.args.buffering_time} miliseconds")
         self.chunks_to_buffer = int(math.ceil(minimal.args.buffering_time / 1000 / self.chunk_time))
         self.zero_chunk = self.generate_zero_chunk()
-        self.cells_in_buffer = self.chunks_to_buffer * 2
-        self._buffer = [None] * self.cells_in_buffer
-        for i in range(self.cells_in_buffer):
-            self._buffer[i] = self.zero_chunk
+        # The number of cells is rounded up to a power of 2 (that
+        # divides CHUNK_NUMBERS), so that the cell of a chunk can be
+        # found with a mask instead of a modulo.
+        self.cells_in_buffer = 1 << (self.chunks_to_buffer * 2 - 1).bit_length()
+        self.cells_mask = self.cells_in_buffer - 1
+        logging.info(f"cells_in_buffer = {self.cells_in_buffer}")
+        # All the cells are stored in a single contiguous array, and
+        # the received chunks are copied into them.
+        self._buffer = self.allocate_locked_buffer((self.cells_in_buffer,) + self.chunk_shape)
         #self.sock.settimeout(self.chunk_time)
         #self.sock.settimeout(0)
+        # Reception buffer, reused by every received packet.
+        self._packet = bytearray(self.MAX_PAYLOAD_BYTES)
+        self._packet_view = memoryview(self._packet)
+        # Transmission buffer, reused by every packed chunk: a 2-bytes
+        # header (the chunk number) followed by the samples.
+        self._tx_packet = bytearray(2 + self.MAX_PAYLOAD_BYTES)
+        self._tx_packet_view = memoryview(self._tx_packet)
+        self._tx_samples = np.frombuffer(self._tx_packet, dtype=np.int16, offset=2)
         self.chunk_number = 0
         logging.info(f"chunks_to_buffer = {self.chunks_to_buffer}")
+        self.tune_receiving_socket()
 
         if minimal.args.filename:
             logging.info(f"Using \"{minimal.args.filename}\" as input")
@@ -49,9 +81,58 @@ class Buffering(minimal.Minimal):
             self._handler = self._record_IO_and_play
             self.stream = self.mic_stream
 
+    def allocate_locked_buffer(self, shape):
+        '''Allocates a zeroed int16 array in an anonymous memory map
+        (page-aligned, and therefore also cache-line-aligned), and
+        tries to lock it in RAM so that it cannot be paged out while
+        playing. Locking is optional (it is limited by "ulimit -l").'''
+        nbytes = int(np.prod(shape)) * np.dtype(np.int16).itemsize
+        self._buffer_memory = mmap.mmap(-1, nbytes) # Zeroed by the kernel.
+        locked_buffer = np.frombuffer(self._buffer_memory, dtype=np.int16).reshape(shape)
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.mlock(ctypes.c_void_p(locked_buffer.ctypes.data), ctypes.c_size_t(nbytes)) != 0:
+                logging.warning(f"Unable to lock the buffer in RAM: {os.strerror(ctypes.get_errno())}")
+        except (OSError, AttributeError, TypeError):
+            logging.warning("mlock() not available (optional)")
+        return locked_buffer
+
+    def tune_receiving_socket(self):
+        '''Reduces the latency between the arrival of a packet and its
+        reception: SO_BUSY_POLL makes the kernel poll the NIC instead
+        of waiting for its interrupt. Optional, and only in Linux.'''
+        if minimal.args.busy_poll > 0:
+            if sys.platform.startswith("linux"):
+                try:
+                    self.sock.setsockopt(socket.SOL_SOCKET, getattr(socket, "SO_BUSY_POLL", 46), minimal.args.busy_poll)
+                    logging.info(f"busy_poll = {minimal.args.busy_poll} microseconds")
+                except OSError as e:
+                    logging.warning(f"Unable to set SO_BUSY_POLL: {e}")
+            else:
+                logging.warning("SO_BUSY_POLL is only available in Linux")
+
+    def pin_receiving_thread(self):
+        '''Pins the calling (receiving) thread to the receiving
+        CPU. Notice that it must be called after creating the stream,
+        because the threads inherit the affinity of their creator. It
+        does not steer the packets to that CPU: that is decided by the
+        NIC (RSS) and the kernel (RPS/RFS).'''
+        if minimal.args.receiving_CPU is not None:
+            try:
+                os.sched_setaffinity(0, {minimal.args.receiving_CPU})
+                logging.info(f"receiving_CPU = {minimal.args.receiving_CPU}")
+            except (OSError, AttributeError) as e:
+                logging.warning(f"Unable to pin the receiving thread: {e}")
+
     def pack(self, chunk_number, chunk):
-        '''Concatenates a chunk number to the chunk.'''
-        packed_chunk = struct.pack("!H", chunk_number) + chunk.tobytes()
+        '''Concatenates a chunk number to the chunk. Notice that the
+        returned packed chunk is a view of the transmission buffer,
+        and therefore, it is only valid until the next call.'''
+        struct.pack_into("!H", self._tx_packet, 0, chunk_number)
+        # The samples are copied straight from the chunk (with its own
+        # strides) into the packet, without a contiguous copy first.
+        np.copyto(self._tx_samples[:chunk.size].reshape(chunk.shape), chunk, casting="unsafe")
+        packed_chunk = self._tx_packet_view[:2 + chunk.size*2]
         return packed_chunk
 
     def unpack(self, packed_chunk):
@@ -64,19 +145,26 @@ class Buffering(minimal.Minimal):
         return chunk_number, chunk
 
     def buffer_chunk(self, chunk_number, chunk):
-        self._buffer[chunk_number % self.cells_in_buffer] = chunk
+        '''Copies the chunk into its cell of the buffer.'''
+        cell = self._buffer[chunk_number & self.cells_mask]
+        np.copyto(cell, chunk.reshape(self.chunk_shape), casting="unsafe")
 
     def unbuffer_next_chunk(self):
-        chunk = self._buffer[self.played_chunk_number % self.cells_in_buffer]
+        '''Returns (a view of) the cell of the next chunk to play.'''
+        chunk = self._buffer[self.played_chunk_number & self.cells_mask]
         return chunk
 
     def play_chunk(self, DAC, chunk):
-        self.played_chunk_number = (self.played_chunk_number + 1) % self.cells_in_buffer
-        chunk = chunk.reshape(minimal.args.frames_per_chunk, self.NUMBER_OF_CHANNELS)
+        self.played_chunk_number = (self.played_chunk_number + 1) & self.cells_mask
+        # The cells of the buffer are already shaped as the DAC.
         DAC[:] = chunk
 
     def receive(self):
-        packed_chunk, sender = self.sock.recvfrom(self.MAX_PAYLOAD_BYTES)
+        '''Receives a packet into the reception buffer. Notice that the
+        returned packed chunk is a view of that buffer, and therefore,
+        it is only valid until the next call.'''
+        nbytes, sender = self.sock.recvfrom_into(self._packet)
+        packed_chunk = self._packet_view[:nbytes]
         return packed_chunk
 
     def receive_and_buffer(self):
@@ -88,16 +176,18 @@ class Buffering(minimal.Minimal):
         return chunk_number
 
     def _record_IO_and_play(self, ADC, DAC, frames, time, status):
-        self.chunk_number = (self.chunk_number + 1) % self.CHUNK_NUMBERS
-        packed_chunk = self.pack(self.chunk_number, ADC)
+        chunk_number = (self.chunk_number + 1) & self.CHUNK_NUMBERS_MASK
+        self.chunk_number = chunk_number
+        packed_chunk = self.pack(chunk_number, ADC)
         self.send(packed_chunk)
         chunk = self.unbuffer_next_chunk()
         self.play_chunk(DAC, chunk)
 
     def _read_IO_and_play(self, DAC, frames, time, status):
-        self.chunk_number = (self.chunk_number + 1) % self.CHUNK_NUMBERS
+        chunk_number = (self.chunk_number + 1) & self.CHUNK_NUMBERS_MASK
+        self.chunk_number = chunk_number
         read_chunk = self.read_chunk_from_file()
-        packed_chunk = self.pack(self.chunk_number, read_chunk)
+        packed_chunk = self.pack(chunk_number, read_chunk)
         self.send(packed_chunk)
         chunk = self.unbuffer_next_chunk()
         self.play_chunk(DAC, chunk)
@@ -109,6 +199,7 @@ class Buffering(minimal.Minimal):
         logging.info("Press CTRL+c to quit")
         self.played_chunk_number = 0
         with self.stream(self._handler):
+            self.pin_receiving_thread()
             first_received_chunk_number = self.receive_and_buffer()
             logging.debug("first_received_chunk_number =", first_received_chunk_number)
 
@@ -181,6 +272,7 @@ class Buffering__verbose(Buffering, minimal.Minimal__verbose):
         self.played_chunk_number = 0
         with self.stream(self._handler):
             cycle_feedback_thread.start()
+            self.pin_receiving_thread()
             self.loop_receive_and_buffer()
 
 try:
@@ -9,9 +9,8 @@ import math
 import logging
 
 #import pygame_widgets
-import pygame
-from pygame_widgets.slider import Slider
-from pygame_widgets.textbox import TextBox
+# pygame, pygame_widgets and scipy.signal are only used by the verbose
+# version, and are imported in __main__ when it is selected.
 
 import minimal
 import buffer
@@ -19,12 +18,10 @@ import buffer
 
 import threading
 
-from scipy import signal
-import tkinter as tk
-#from tkinter import ttk
-
 class Delay_Slider():
     def __init__(self, root):
+        import tkinter as tk
+        from tkinter import ttk
         self.root = root
         self.root.title('Sine Wave with Slider')
 
@@ -51,10 +48,16 @@ class Echo_Cancellation(buffer.Buffering):
         logging.info(__doc__)
         self.delay = 20 # In frames
         self.attenuation = 0.5
+        # The attenuation is applied in Q15 fixed-point arithmetic,
+        # which keeps the echo estimation in the integer domain of the
+        # samples.
+        self.attenuation_Q15 = int(round(self.attenuation * (1 << 15)))
         #self.sent_chunks = queue.Queue()
         #for i in range(self.chunks_to_buffer):
         #    self.sent_chunks.put(self.zero_chunk)
-        self.last_played_chunk = self.zero_chunk
+        # A copy (not a view of a cell of the buffer, that is rewritten
+        # by the receiving thread) of the last played chunk.
+        self.last_played_chunk = self.generate_zero_chunk()
 
     def __record_io_and_play(self, indata, outdata, frames, time, status):
         super()._record_io_and_play(indata, outdata, frames, time, status)
@@ -72,6 +75,10 @@ class Echo_Cancellation__verbose(Echo_Cancellation, buffer.Buffering__verbose):
         self.corr_data = self.generate_zero_chunk()[:, 0]
 
         self.recorded_chunk = self.generate_zero_chunk()
+        # Scratch for the echo estimation, and the echo-cancelled
+        # chunk, allocated once.
+        self.echo_chunk = np.empty(self.chunk_shape, dtype=np.int32)
+        self.no_echo_chunk = self.generate_zero_chunk()
 
         self.window_heigh = 1024
         self.display = pygame.display.set_mode((minimal.args.frames_per_chunk, self.window_heigh))
@@ -144,7 +151,10 @@ class Echo_Cancellation__verbose(Echo_Cancellation, buffer.Buffering__verbose):
     def normalize(self, x):
         _max = np.max(x).astype(np.float32)
         _min = np.min(x).astype(np.float32)
-        nx = (x - _min)/(_max - _min)
+        # A single (contiguous) copy of x, normalized in place.
+        nx = x.astype(np.float32)
+        nx -= _min
+        nx /= (_max - _min)
         return nx
 
     def get_correlation(self, in1, in2):
@@ -162,13 +172,12 @@ class Echo_Cancellation__verbose(Echo_Cancellation, buffer.Buffering__verbose):
         return corr
         
     def play_chunk(self, DAC, chunk):
-        self.played_chunk_number = (self.played_chunk_number + 1) % self.cells_in_buffer
-        chunk = chunk.reshape(minimal.args.frames_per_chunk, self.NUMBER_OF_CHANNELS)
+        self.played_chunk_number = (self.played_chunk_number + 1) & self.cells_mask
         a = chunk[:, 1]
         #a = self.recorded_chunk[:, 1] #chunk[:, 0]
         #old_sent_chunk = self.sent_chunks.get()
         #v = old_sent_chunk[:, 1]
-        v = self._buffer[(self.played_chunk_number - 2) % self.cells_in_buffer].reshape(minimal.args.frames_per_chunk, self.NUMBER_OF_CHANNELS)[:, 1]
+        v = self._buffer[(self.played_chunk_number - 2) & self.cells_mask][:, 1]
         #v = a
         #v = np.concatenate([0.5*a[:100].astype(np.int16), a])
         #print(len(v))
@@ -193,7 +202,7 @@ class Echo_Cancellation__verbose(Echo_Cancellation, buffer.Buffering__verbose):
         #DAC[:] = self.zero_chunk
         print(self.delay, end=' ')
         DAC[:] = chunk
-        self.last_played_chunk = chunk
+        np.copyto(self.last_played_chunk, chunk)
 
     def pack(self, chunk_number, last_recorded_chunk):
         #chunk = chunk - np.roll(self.recorded_chunk, -4)
@@ -201,8 +210,22 @@ class Echo_Cancellation__verbose(Echo_Cancellation, buffer.Buffering__verbose):
         #print(self.recorded_chunk)
         #print(chunk)
         #print(last_recorded_chunk)
-        self.no_echo_chunk = last_recorded_chunk.astype(np.int32) - (self.attenuation*np.roll(self.last_played_chunk, self.delay)).astype(np.int32)
-        self.no_echo_chunk = self.no_echo_chunk.astype(np.int16)
+        # Attributes used more than once are looked up only once.
+        echo_chunk = self.echo_chunk
+        attenuation_Q15 = self.attenuation_Q15
+        played = self.last_played_chunk.reshape(-1)
+        echo = echo_chunk.reshape(-1)
+        size = played.size
+        delay = self.delay % size
+        # The same as echo = np.roll(played, delay)*attenuation_Q15,
+        # but rolling, widening and scaling in a single pass.
+        np.multiply(played[:size - delay], attenuation_Q15, out=echo[delay:], dtype=np.int32)
+        np.multiply(played[size - delay:], attenuation_Q15, out=echo[:delay], dtype=np.int32)
+        echo >>= 15
+        np.subtract(last_recorded_chunk, echo_chunk, out=echo_chunk)
+        # Saturate, instead of wrapping around, when going back to
+        # int16, writing directly into the echo-cancelled chunk.
+        np.clip(echo_chunk, -32768, 32767, out=self.no_echo_chunk, casting="unsafe")
         #print(last_recorded_chunk)
 
         packed_chunk = super().pack(chunk_number, self.no_echo_chunk)
@@ -224,6 +247,10 @@ if __name__ == "__main__":
     minimal.args = minimal.parser.parse_known_args()[0]
 
     if minimal.args.show_stats or minimal.args.show_samples:
+        import pygame
+        from pygame_widgets.slider import Slider
+        from pygame_widgets.textbox import TextBox
+        from scipy import signal
         intercom = Echo_Cancellation__verbose()
     else:
         intercom = Echo_Cancellation()
@@ -50,6 +50,7 @@ class Minimal:
     MAX_PAYLOAD_BYTES = 32768 # The maximum UDP packet's payload.
     #SAMPLE_TYPE = np.int16    # The number of bits per sample.
     NUMBER_OF_CHANNELS = 2    # The number of channels. Currently, in OSX systems NUMBER_OF_CHANNELS must be 1.
+    SEND_FLAGS = getattr(socket, "MSG_DONTWAIT", 0) # Non-blocking sends (when available).
 
     def __init__(self):
         ''' Constructor. Basically initializes the sockets stuff. '''
@@ -58,7 +59,13 @@ class Minimal:
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.listening_endpoint = ("0.0.0.0", args.listening_port)
         self.sock.bind(self.listening_endpoint)
+        # The destination is resolved only once, instead of at every sendto().
+        self.destination_endpoint = (socket.gethostbyname(str(args.destination_address)), args.destination_port)
+        logging.info(f"destination_endpoint = {self.destination_endpoint}")
         self.chunk_time = args.frames_per_chunk / args.frames_per_second
+        # Cached here to avoid looking them up at each callback.
+        self.frames_per_chunk = int(args.frames_per_chunk)
+        self.chunk_shape = (self.frames_per_chunk, self.NUMBER_OF_CHANNELS)
         logging.info(f"chunk_time = {self.chunk_time} seconds")
         self.zero_chunk = self.generate_zero_chunk()
 
@@ -83,13 +90,16 @@ class Minimal:
         # We need to reshape packed_chunk, that comes as sequence of
         # bytes, as a NumPy array.
         chunk = np.frombuffer(packed_chunk, np.int16)
-        chunk = chunk.reshape(args.frames_per_chunk, self.NUMBER_OF_CHANNELS)
+        chunk = chunk.reshape(self.chunk_shape)
         return chunk
     
     def send(self, packed_chunk):
-        '''Sends an UDP packet.'''
+        '''Sends an UDP packet. The packet is never waited for: if the
+        socket's send buffer is full, it is dropped, even if the
+        socket is in blocking mode (as it is for receiving in
+        buffer.Buffering).'''
         try:
-            self.sock.sendto(packed_chunk, (args.destination_address, args.destination_port))
+            self.sock.sendto(packed_chunk, self.SEND_FLAGS, self.destination_endpoint)
         except BlockingIOError:
             pass
 
@@ -151,25 +161,26 @@ class Minimal:
             chunk = self.unpack(packed_chunk)
         except (socket.timeout, BlockingIOError):
             #chunk = np.zeros((args.frames_per_chunk, self.NUMBER_OF_CHANNELS), self.SAMPLE_TYPE)
-            chunk = self.zero_chunk
+            DAC.fill(0) # A memset, instead of copying self.zero_chunk.
             logging.debug("playing zero chunk")
-        DAC[:] = chunk
+        else:
+            DAC[:] = chunk
         if __debug__:
             #if not np.array_equal(ADC, DAC):
             #    print("ADC[0] =", ADC[0], "DAC[0] =", DAC[0])
             print(next(spinner), end='\b', flush=True)
 
     def read_chunk_from_file(self):
-        chunk = self.wavfile.buffer_read(args.frames_per_chunk, dtype='int16')
+        chunk = self.wavfile.buffer_read(self.frames_per_chunk, dtype='int16')
         #print(len(chunk), args.frames_per_chunk)
-        if len(chunk) < args.frames_per_chunk*4:
+        if len(chunk) < self.frames_per_chunk*self.NUMBER_OF_CHANNELS*2:
             logging.warning("Input exhausted! :-/")
             pid = os.getpid()
             os.kill(pid, signal.SIGINT)
             return self.zero_chunk
         chunk = np.frombuffer(chunk, dtype=np.int16)
         #try:
-        chunk = np.reshape(chunk, (args.frames_per_chunk, self.NUMBER_OF_CHANNELS))
+        chunk = np.reshape(chunk, self.chunk_shape)
         #except ValueError:
             #logging.warning("Input exhausted! :-/")
             #pid = os.getpid()
@@ -188,8 +199,10 @@ class Minimal:
             chunk = self.unpack(packed_chunk)
         except (socket.timeout, BlockingIOError, ValueError):
             chunk = self.zero_chunk
+            DAC.fill(0) # A memset, instead of copying self.zero_chunk.
             logging.debug("playing zero chunk")
-        DAC[:] = chunk
+        else:
+            DAC[:] = chunk
         if __debug__:
             print(next(spinner), end='\b', flush=True)
         return chunk
@@ -288,8 +301,9 @@ class Minimal__verbose(Minimal):
         self.frames_per_cycle = self.seconds_per_cycle * args.frames_per_second
         self.chunks_per_cycle = self.frames_per_cycle / args.frames_per_chunk
 
+        self.process = psutil.Process() # Opened once, sampled at each cycle.
         self.old_time = time.time()
-        self.old_CPU_time = psutil.Process().cpu_times()[0]
+        self.old_CPU_time = self.process.cpu_times()[0]
 
         self.total_number_of_sent_chunks = 0
         self.chunks_to_sent = 999999
@@ -446,13 +460,14 @@ class Minimal__verbose(Minimal):
         ''' Computes and shows the statistics. '''
 
         elapsed_time = time.time() - self.old_time
-        elapsed_CPU_time = psutil.Process().cpu_times()[0] - self.old_CPU_time
+        CPU_time = self.process.cpu_times()[0]
+        elapsed_CPU_time = CPU_time - self.old_CPU_time
         self.CPU_usage = 100 * elapsed_CPU_time / elapsed_time
         self.global_CPU_usage = psutil.cpu_percent()
         self.average_CPU_usage = self.moving_average(self.average_CPU_usage, self.CPU_usage, self.cycle)
         self.average_global_CPU_usage = self.moving_average(self.average_global_CPU_usage, self.global_CPU_usage, self.cycle)
         self.old_time = time.time()
-        self.old_CPU_time = psutil.Process().cpu_times()[0]
+        self.old_CPU_time = CPU_time
 
         self.average_sent_messages = self.moving_average(self.average_sent_messages, self.sent_messages_count, self.cycle)
         self.average_received_messages = self.moving_average(self.average_received_messages, self.received_messages_count, self.cycle)
@@ -462,11 +477,14 @@ class Minimal__verbose(Minimal):
         self.average_sent_KBPS = self.moving_average(self.average_sent_KBPS, self.sent_KBPS, self.cycle)
         self.average_received_KBPS = self.moving_average(self.average_received_KBPS, self.received_KBPS, self.cycle)
 
-        self.print_stats()
-        self.print_averages()
-        self.print_separator()        
-        self.print_trailer()
-        print("\033[5A")
+        # The whole feedback is written at once, instead of one write
+        # per line, to hold the GIL (and the terminal) for less time.
+        print('\n'.join([self.stats(),
+                         "\033[7m" + self.averages() + "\033[m",
+                         self.separator(),
+                         self.second_line(),
+                         self.first_line(),
+                         "\033[5A"]))
 
         self.total_number_of_sent_chunks += self.sent_messages_count
         self.sent_bytes_count = 0